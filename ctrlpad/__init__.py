@@ -11,16 +11,19 @@ __all__ = ['run_application']
 from .sdl import GLAppWindow, Cursor
 from .opengl import gl
 from .renderer import Renderer
-from .color import set_global_gamma
+from . import color
+from .util import cached_localtime
 from ctrlpad.controls import merge_time, ControlEnvironment, TabSheet
 
 
 class CtrlPadAppWindow(GLAppWindow):
     invisible_quit_button_size = 20
+    redraw_on_mouse_motion = False
 
     def on_init(self):
         self.quit_timeout = None
-        self.tl_clock_last_minute = 0
+        self.tl_clock_last_minute = None
+        self.tl_clock_texts = tuple(f"{h}:{m:02d}" for h in range(24) for m in range(60))
 
     def on_resize(self, old_w, old_h):
         w, h = self.vp_width, self.vp_height
@@ -31,11 +34,11 @@ class CtrlPadAppWindow(GLAppWindow):
 
     def on_draw(self, t):
         # update the clock
-        res = None
-        tm = time.localtime(t)
-        if tm.tm_min != self.tl_clock_last_minute:
-            self.env.toplevel.set_text(f"{tm.tm_hour}:{tm.tm_min:02d}")
-            self.tl_clock_last_minute = tm.tm_min
+        tm = cached_localtime(t)
+        minute = tm.tm_hour * 60 + tm.tm_min
+        if minute != self.tl_clock_last_minute:
+            self.env.toplevel.set_text(self.tl_clock_texts[minute])
+            self.tl_clock_last_minute = minute
         res = (60 - tm.tm_sec) + (1.0 - (t - int(t)))
 
         # actual drawing
@@ -51,7 +54,7 @@ class CtrlPadAppWindow(GLAppWindow):
     def on_mouse_down(self, x: int, y: int, button: int):
         logging.debug("click @ %d,%d", x, y)
         if (x > (self.vp_width - self.invisible_quit_button_size)) and (y < self.invisible_quit_button_size):
-            now = time.time()
+            now = time.monotonic()
             if self.quit_timeout and (now < self.quit_timeout):
                 self.quit()
             else:
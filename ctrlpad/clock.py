@@ -1,13 +1,14 @@
 # SPDX-FileCopyrightText: 2024 Martin J. Fiedler <keyj@emphy.de>
 # SPDX-License-Identifier: MIT
 
+import array
 import math
-import time
 
 from .sdl import GLAppWindow
 from .renderer import Renderer
 from .controls import Control, ControlEnvironment
 from . import color
+from .util import cached_localtime
 
 __all__ = ['Clock']
 
@@ -28,6 +29,13 @@ class Clock(Control):
     .###.|.###.|#####|.###.|...#.|.###.|.###.|..#..|.###.|.##..
     """.strip().split('\n')]
 
+    # direction vectors (sine, cosine) of the 60 seconds band dots
+    second_dirs = [(math.sin(a), math.cos(a)) for a in (i * math.pi / 30.0 for i in range(60))]
+
+    # bitmask of the digits that light up the dot at [y][x]
+    digit_masks = [[sum(1 << d for d, glyph in enumerate(row) if glyph[x] == '#') for x in range(5)]
+                   for row in bitmap]
+
     def __init__(self, **style):
         """
         Instantiate the clock with the following (mostly optional) parameters:
@@ -42,6 +50,9 @@ class Clock(Control):
         - text_radius   = radius of the HH:MM text dots (1.0=use maximum available space)
         - text_slant    = slant angle of the text (0.0=none)
         - text_space    = relative space between digits in the HH:MM text (1.0=normal dot width)
+        - blink         = True (default) to blink the colon every half second;
+                          False for a steady colon, which only requires
+                          one redraw per second
         """
         super().__init__(**style)
 
@@ -61,12 +72,12 @@ class Clock(Control):
             r_cen = r * (1.0 - ss * 0.5)
             self.second_dot_radius = min(r - r_cen, r_cen * math.pi / 60.0) * self.get('second_radius', 0.6)
             r *= 1.0 - ss
-            self.second_dots = [
-                (i, x-self.second_dot_radius, y-self.second_dot_radius, x+self.second_dot_radius, y+self.second_dot_radius)
-                for i,x,y in ((i, cx + r_cen * math.sin(a), cy - r_cen * math.cos(a))
-                for i,a in ((i, i * math.pi / 30.0) for i in range(60)))]
+            self.second_coords = array.array('d')
+            for x,y in ((cx + r_cen * sin_a, cy - r_cen * cos_a) for sin_a, cos_a in self.second_dirs):
+                self.second_coords.extend((x-self.second_dot_radius, y-self.second_dot_radius,
+                                           x+self.second_dot_radius, y+self.second_dot_radius))
         else:
-            self.second_dots = []
+            self.second_coords = array.array('d')
 
         # text metrics
         text_slant = -self.get('text_slant', 0.1)
@@ -76,10 +87,15 @@ class Clock(Control):
         self.dot_slant = self.dot_distance * text_slant
         char_gap = self.dot_distance * text_space
         # create blinking colon
-        self.dots = [(cx - self.dot_slant - self.dot_radius, cy - self.dot_distance - self.dot_radius,
-                      cx - self.dot_slant + self.dot_radius, cy - self.dot_distance + self.dot_radius, 2, (0,1)),
-                     (cx + self.dot_slant - self.dot_radius, cy + self.dot_distance - self.dot_radius,
-                      cx + self.dot_slant + self.dot_radius, cy + self.dot_distance + self.dot_radius, 2, (0,1))]
+        # (dots are stored as two parallel sequences: a flat array of the
+        # coordinates, and the character index + a bitmask of the digit
+        # values that light it up)
+        self.dot_coords = array.array('d', (
+            cx - self.dot_slant - self.dot_radius, cy - self.dot_distance - self.dot_radius,
+            cx - self.dot_slant + self.dot_radius, cy - self.dot_distance + self.dot_radius,
+            cx + self.dot_slant - self.dot_radius, cy + self.dot_distance - self.dot_radius,
+            cx + self.dot_slant + self.dot_radius, cy + self.dot_distance + self.dot_radius))
+        self.dot_bits = [(2, 0b10), (2, 0b10)]
         # shift coordinate to top row
         cx -= 3 * self.dot_slant
         cy -= 3 * self.dot_distance
@@ -89,31 +105,57 @@ class Clock(Control):
         self._add_char(cx +  1 * self.dot_distance + 1 * char_gap, cy, 3)
         self._add_char(cx +  6 * self.dot_distance + 2 * char_gap, cy, 4)
 
+        # the geometry is fixed now; bake it into a specialized draw function
+        self.draw_dots = _make_draw_dots(self.second_coords, self.second_dot_radius if ss > 0.0 else 0.0,
+                                         self.dot_coords, self.dot_radius,
+                                         self.dot_bits, self.dot_colors)
+
     def _add_char(self, tx: float, ty: float, idx: int):
-        for y in range(7):
-            self.dots.extend(
-                (tx + x * self.dot_distance - self.dot_radius, ty - self.dot_radius,
-                 tx + x * self.dot_distance + self.dot_radius, ty + self.dot_radius,
-                 idx, tuple(int(self.bitmap[y][d][x] == '#') for d in range(10)))
-                for x in range(5))
-            ty += self.dot_distance
+        dd, dr = self.dot_distance, self.dot_radius
+        for masks in self.digit_masks:
+            for x in range(5):
+                self.dot_coords.extend((tx + x * dd - dr, ty - dr,
+                                        tx + x * dd + dr, ty + dr))
+            self.dot_bits.extend((idx, mask) for mask in masks)
+            ty += dd
             tx += self.dot_slant
 
     def do_draw(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
         # parse the time into the local digit data structure
         t = env.draw_time
         frac = t - int(t)
-        half = int(frac < 0.5)
-        t = time.localtime(t)
-        s = t.tm_sec
-        t = (t.tm_hour // 10, t.tm_hour % 10, half, t.tm_min // 10, t.tm_min % 10)
+        blink = self.get('blink', True)
+        half = int(frac < 0.5) if blink else 1
+        t = cached_localtime(t)
+        digits = (t.tm_hour // 10, t.tm_hour % 10, half, t.tm_min // 10, t.tm_min % 10)
 
         # draw everything
-        env.renderer.box(x0,y0,x1,y1, self.get('background', "111"), radius=self.background_radius)
-        for i, dx0, dy0, dx1, dy1 in self.second_dots:
-            env.renderer.box(dx0,dy0,dx1,dy1, self.dot_colors[int(s >= i)], radius=self.second_dot_radius)
-        for dx0, dy0, dx1, dy1, i, vmap in self.dots:
-            env.renderer.box(dx0,dy0,dx1,dy1, self.dot_colors[vmap[t[i]]], radius=self.dot_radius)
+        renderer = env.renderer
+        renderer.box(x0,y0,x1,y1, self.get('background', "111"), radius=self.background_radius)
+        self.draw_dots(renderer, t.tm_sec, digits)
 
         # order the next update
+        if not blink:
+            return 1.0 - frac
         return (1.0 - frac) if (frac > 0.5) else (0.5 - frac)
+
+
+def _make_draw_dots(second_coords, second_radius, dot_coords, dot_radius, dot_bits, dot_colors):
+    """create a function draw_dots(renderer, second, digits) that draws the
+    seconds band and the digits of a clock with the given fixed geometry"""
+    dim, lit = dot_colors
+    drawn_state = None
+    second_colors = char_colors = None
+
+    def draw_dots(renderer, s, digits):
+        nonlocal drawn_state, second_colors, char_colors
+        # update the dot colors only if the displayed state changed
+        if (s, digits) != drawn_state:
+            drawn_state = (s, digits)
+            second_colors = [lit] * (s + 1) + [dim] * (59 - s)
+            char_colors = [dot_colors[(mask >> digits[i]) & 1] for i, mask in dot_bits]
+        if second_coords:
+            renderer.boxes(second_coords, second_colors, radius=second_radius)
+        renderer.boxes(dot_coords, char_colors, radius=dot_radius)
+
+    return draw_dots
@@ -4,35 +4,53 @@
 Conversion to and operations on color values represented as RGBA 4-tuples
 of normalized floating point sRGB values.
 """
+import functools
 import logging
 import math
 
 _importcache = {}
 
+# module-level bindings for the scalar math in the conversion functions
+_cos, _sin = math.cos, math.sin
+_deg2rad = math.pi / 180.0
+
+# lookup tables for hex code parsing
+_u8_to_float = tuple(i / 255 for i in range(256))
+_u4_to_float = tuple(i / 15 for i in range(16))
+
 def parse(c):
     "import a color from a hex code into the standard format"
+    if c.__class__ is str:
+        res = _importcache.get(c)
+        if res: return res
     if isinstance(c, (tuple, list)):
         if len(c) == 4: return c
         if len(c) == 3: return (*c, 1.0)
+    raw = c
+    if isinstance(c, str):
+        c = (c[1:] if c.startswith('#') else c).lower()
     try:
-        return _importcache[c]
+        res = _importcache[raw] = _importcache[c]
+        return res
     except KeyError:
         pass
     res = None
     if isinstance(c, str):
-        if c.startswith('#'): c = c[1:]
-        res = None
         try:
-            if len(c) == 3: res = (int(c[0],16)/15, int(c[1],16)/15, int(c[2],16)/15, 1.0)
-            if len(c) == 4: res = tuple(int(_,16)/15 for _ in c)
-            if len(c) == 6: res = (int(c[0:2],16)/255, int(c[2:4],16)/255, int(c[4:6],16)/255, 1.0)
-            if len(c) == 8: res = (int(c[0:2],16)/255, int(c[2:4],16)/255, int(c[4:6],16)/255, int(c[6:8],16)/255)
+            if len(c) in (3, 4):
+                res = tuple(_u4_to_float[int(x, 16)] for x in c)
+                if len(res) == 3: res += (1.0,)
+            elif len(c) in (6, 8):
+                b = bytes.fromhex(c)
+                if len(b) * 2 == len(c):
+                    res = (_u8_to_float[b[0]], _u8_to_float[b[1]], _u8_to_float[b[2]],
+                           _u8_to_float[b[3]] if (len(b) > 3) else 1.0)
         except ValueError:
             pass
     if not res:
         logging.error("invalid color %s", repr(c))
         res = (1.0, 0.0, 1.0, 1.0)
-    _importcache[c] = res
+    _importcache[c] = _importcache[raw] = res
     return res
 
 
@@ -45,6 +63,7 @@ def srgb2linear(x: float):
     return (x / 12.92) if (x <= 0.04045) else (((x + 0.055) / 1.055) ** 2.4)
 
 
+@functools.lru_cache(maxsize=1024)
 def oklab(l: float, a: float = 0.0, b: float = 0.0, alpha: float = 1.0):
     "generate a color by converting it from the Oklab color space"
     l_ = l + 0.3963377774 * a + 0.2158037573 * b;  l_ *= l_ * l_
@@ -57,29 +76,47 @@ def oklab(l: float, a: float = 0.0, b: float = 0.0, alpha: float = 1.0):
         alpha)
 
 
+@functools.lru_cache(maxsize=1024)
 def oklch(l: float, c: float, h: float, alpha: float = 1.0):
     "generate a color by converting it from the Oklch color space"
-    a = math.radians(h)
-    return oklab(l, c * math.cos(a), c * math.sin(a), alpha)
+    a = h * _deg2rad
+    return oklab(l, c * _cos(a), c * _sin(a), alpha)
 
 
+@functools.lru_cache(maxsize=1024)
 def lch2lab(l: float, c: float, h: float):
     "convert Lch color coordinate into Lab color coordinate"
-    a = math.radians(h)
-    return (l, c * math.cos(a), c * math.sin(a))
+    a = h * _deg2rad
+    return (l, c * _cos(a), c * _sin(a))
 
 
 def lerp(a, b, t: float):
     "linearly interpolate values from a to b; inputs can be scalars or sequences"
     if isinstance(a, (int, float)):
         return a + (b - a) * t
-    else:
-        return tuple((xa + (xb - xa) * t) for xa, xb in zip(a, b))
+    if len(a) == 4 and len(b) == 4:
+        # fast path for the common case of two RGBA colors
+        a0, a1, a2, a3 = a
+        b0, b1, b2, b3 = b
+        return (a0 + (b0 - a0) * t, a1 + (b1 - a1) * t, a2 + (b2 - a2) * t, a3 + (b3 - a3) * t)
+    return tuple((xa + (xb - xa) * t) for xa, xb in zip(a, b))
 
 
+_scalecache = {}
+_scalecache_max_size = 1024
+
 def scale(c, t: float):
     "scale all RGB components (but not alpha) by t, to darken / brighten"
-    return (c[0]*t, c[1]*t, c[2]*t, c[3])
+    try:
+        return _scalecache[c, t]
+    except (KeyError, TypeError):
+        pass
+    res = (c[0]*t, c[1]*t, c[2]*t, c[3])
+    if c.__class__ is tuple:
+        if len(_scalecache) >= _scalecache_max_size:
+            _scalecache.clear()
+        _scalecache[c, t] = res
+    return res
 
 
 def alpha(c, a: float):
@@ -89,12 +126,17 @@ def alpha(c, a: float):
 
 def tohex(c):
     "convert a color tuple back to a hexadecimal representation"
-    return '#' + ''.join("{:02x}".format(min(255, max(0, round(x * 255.0)))) for x in c)
+    return '#' + bytes([min(255, max(0, round(x * 255.0))) for x in c]).hex()
 
 
 def tooklab(c):
     "convert a color tuple to an Oklab (l,a,b) tuple"
-    r_, g_, b_ = map(srgb2linear, c[:3])
+    if c.__class__ is tuple:
+        return _tooklab_cached(c)
+    return _tooklab(c)
+
+def _tooklab(c):
+    r_, g_, b_ = srgb2linear(c[0]), srgb2linear(c[1]), srgb2linear(c[2])
     l_ = (0.4122214708 * r_ + 0.5363325363 * g_ + 0.0514459929 * b_) ** (1.0/3.0)
     m_ = (0.2119034982 * r_ + 0.6806995451 * g_ + 0.1073969566 * b_) ** (1.0/3.0)
     s_ = (0.0883024619 * r_ + 0.2817188376 * g_ + 0.6299787005 * b_) ** (1.0/3.0)
@@ -102,20 +144,34 @@ def tooklab(c):
             1.9779984951 * l_ - 2.4285922050 * m_ + 0.4505937099 * s_,
             0.0259040371 * l_ + 0.7827717662 * m_ - 0.8086757660 * s_)
 
+_tooklab_cached = functools.lru_cache(maxsize=1024)(_tooklab)
+
 
 ###############################################################################
 
 _global_gamma_exp = 1.0
+_finalcache = {}
+_finalcache_max_size = 4096
 
 def set_global_gamma(gamma: float):
     "set global gamma correction"
     global _global_gamma_exp
     _global_gamma_exp = gamma
+    _finalcache.clear()
 
 def finalize(c):
     "parse and apply global gamma to a color"
-    c = parse(c)
-    return (c[0] ** _global_gamma_exp, c[1] ** _global_gamma_exp, c[2] ** _global_gamma_exp, c[3])
+    try:
+        return _finalcache[c]
+    except (KeyError, TypeError):
+        pass
+    p = parse(c)
+    res = (p[0] ** _global_gamma_exp, p[1] ** _global_gamma_exp, p[2] ** _global_gamma_exp, p[3])
+    if isinstance(c, (str, tuple)):
+        if len(_finalcache) >= _finalcache_max_size:
+            _finalcache.clear()
+        _finalcache[c] = res
+    return res
 
 ###############################################################################
 
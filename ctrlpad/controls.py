@@ -1,6 +1,7 @@
 # SPDX-FileCopyrightText: 2024 Martin J. Fiedler <keyj@emphy.de>
 # SPDX-License-Identifier: MIT
 
+import bisect
 import logging
 
 from .sdl import GLAppWindow
@@ -56,6 +57,8 @@ class ControlEnvironment:
         self.window = window
         self.renderer = renderer
         self.draw_time = 0
+        self.frame = 0
+        self.pending_clicks = {}
         self.update_scale()
 
     def set_global_scale(self, scale: float = 1.0):
@@ -79,9 +82,28 @@ class ControlEnvironment:
         return round(x * self.control_scale)
 
     def begin_frame(self, t: float):
-        "begin a frame; notify the renderer and store the current time"
+        "begin a frame; notify the renderer, store the current time and run due delayed clicks"
         self.renderer.begin_frame(self.window.vp_width, self.window.vp_height)
         self.draw_time = t
+        self.frame += 1
+        if self.pending_clicks:
+            self._run_delayed_clicks()
+
+    def schedule_click(self, control, delay: int):
+        """
+        Call control.on_delayed_click(env) at the beginning of the delay'th
+        frame from now. Scheduling a control that is already pending
+        replaces the previous schedule.
+        """
+        self.pending_clicks.pop(control, None)
+        self.pending_clicks[control] = self.frame + delay
+
+    def _run_delayed_clicks(self):
+        due = [control for control, frame in self.pending_clicks.items() if frame <= self.frame]
+        for control in due:
+            del self.pending_clicks[control]
+        for control in due:
+            control.on_delayed_click(self)
 
     def end_frame(self):
         "end a frame; notify the renderer"
@@ -103,38 +125,89 @@ class Control:
     - disabled = inactive; can't be interacted with
     """
 
+    # the core attributes live in slots; all others (including those set
+    # by containers and subclasses) remain in the instance dictionary
+    __slots__ = ('style', '_state', '_resolved', '_state_styles', 'visible', 'children', 'parent', 'geometry',
+                 'self_dirty', 'subtree_dirty', 'layout_scale', 'click_x', 'click_y', 'drag_child',
+                 '__dict__', '__weakref__')
+
     def __init__(self, state=None, visible=True, **style):
         self.style = style
+        self._state_styles = {}
         self.state = state
         self.visible = visible
         self.children = []
+        self.parent = None
         self.geometry = (0,0,0,0)
+        self.layout_scale = None
+        self.self_dirty = self.subtree_dirty = False
         self.invalidate_layout()
         self.click_x, self.click_y = 0, 0
         self.drag_child = None
 
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+        self._resolved = self._state_styles.get(state)
+
+    def _resolve_style(self):
+        """build the style dictionary with all keys resolved for the current state
+        (these are kept for each state, so toggling between states is cheap)"""
+        # (the state may be changed concurrently, e.g. by MPDControl's fade
+        # thread, so it's read only once, and the result is only made the
+        # current style if the state is still the same)
+        state = self._state
+        res = dict(self.style)
+        if state:
+            prefix = state + '_'
+            n = len(prefix)
+            for k, v in self.style.items():
+                if k.startswith(prefix):
+                    res[k[n:]] = v
+        self._state_styles[state] = res
+        if self._state is state:
+            self._resolved = res
+        return res
+
     def get(self, key: str, default=None):
         "get a style parameter, prefixed with the current state, if any"
-        if self.state:
-            return self.style.get(self.state + '_' + key, self.style.get(key, default))
-        else:
-            return self.style.get(key, default)
+        res = self._resolved
+        if res is None:
+            res = self._resolve_style()
+        return res.get(key, default)
 
     def set(self, key: str, value):
-        "set a style parameter"
+        """set a style parameter
+        (always use this instead of modifying self.style directly)"""
         self.style[key] = value
+        self._resolved = None
+        self._state_styles.clear()
 
     def weak_set(self, key: str, value):
         "set a style parameter, unless it's already defined"
         if not(key in self.style):
             self.style[key] = value
+            self._resolved = None
+            self._state_styles.clear()
 
     def invalidate_layout(self):
-        """mark the layout of this control and its children as "dirty"
-        so that it's recomputed during the next frame"""
-        self.layout_valid = False
-        for child in self.children:
-            child.invalidate_layout()
+        """mark the layout of this control (and thus its children) as "dirty"
+        so that it's recomputed during the next frame;
+        the ancestors are only flagged as having a dirty descendant"""
+        if self.self_dirty:
+            return  # already dirty; nothing new to propagate
+        self.self_dirty = True
+        # (stop at the first ancestor that already knows about a dirty
+        # descendant; the remaining ones have been flagged before, or will
+        # reach it while drawing anyway)
+        parent = self.parent
+        while parent and not(parent.subtree_dirty):
+            parent.subtree_dirty = True
+            parent = parent.parent
 
     def layout(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
         """
@@ -146,29 +219,69 @@ class Control:
         position of the children and call layout() on them.
         """
         self.geometry = (x0, y0, x1, y1)
+        self.layout_scale = env.control_scale
         self.do_layout(env, x0, y0, x1, y1)
-        self.layout_valid = True
+        self.self_dirty = False
+
+    def place(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
+        """
+        Same as layout(), but skips the re-computation if the control isn't
+        dirty and neither the geometry nor the global scale changed since
+        the last layout. Container controls shall use this in do_layout()
+        to position their children.
+        """
+        if self.self_dirty or (self.geometry != (x0, y0, x1, y1)) or (self.layout_scale != env.control_scale):
+            self.layout(env, x0, y0, x1, y1)
+        elif self.subtree_dirty:
+            self.update_layout(env)
 
     def do_layout(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
         "actual control-specific layout function; to be overridden in subclasses"
         pass
 
+    def update_layout(self, env: ControlEnvironment):
+        """
+        Re-compute the layout of this control (if it's dirty) and of all
+        visible descendants that have been marked as dirty, keeping the
+        current geometry. Subtrees without dirty controls are skipped.
+        """
+        if self.self_dirty:
+            self.layout(env, *self.geometry)
+        if self.subtree_dirty:
+            self.subtree_dirty = False
+            for child in self.children:
+                if child.visible and (child.self_dirty or child.subtree_dirty):
+                    child.update_layout(env)
+
     def draw(self, env: ControlEnvironment):
         """
         Draw the control.
 
         This is the interface function; the actual work is done in do_draw.
-        This function also calls draw() on all children.
+        This function also draws all visible descendants that are (at least
+        partially) on the screen, parents before children (iteratively, i.e.
+        without calling draw() on them).
         Also updates the layout if it has been marked as dirty using
         invalidate_layout().
         """
-        if not self.visible:
-            return
-        if not self.layout_valid:
-            self.layout(env, *self.geometry)
-        res = self.do_draw(env, *self.geometry)
-        for child in self.children:
-            res = merge_time(res, child.draw(env))
+        res = None
+        vp_width, vp_height = env.window.vp_width, env.window.vp_height
+        stack = [self]
+        while stack:
+            control = stack.pop()
+            # (visibility is checked here and not when pushing, as drawing
+            # a control may change the visibility of later ones)
+            if not control.visible:
+                continue
+            # skip controls (and thus their children) outside of the screen
+            x0, y0, x1, y1 = control.geometry
+            if (x1 <= 0) or (y1 <= 0) or (x0 >= vp_width) or (y0 >= vp_height):
+                continue
+            if control.self_dirty or control.subtree_dirty:
+                control.update_layout(env)
+            res = merge_time(res, control.do_draw(env, *control.geometry))
+            if control.children:
+                stack.extend(reversed(control.children))
         return res
 
     def do_draw(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
@@ -184,11 +297,19 @@ class Control:
         Subclasses override this with control-specific functionality.
         """
         self.click_x, self.click_y = x, y
-        for child in self.children:
-            x0, y0, x1, y1 = child.geometry
-            if child.visible and (x0 <= x < x1) and (y0 <= y < y1):
-                self.drag_child = child
-                child.on_click(env, x, y)
+        child = self.child_at(x, y)
+        if child:
+            self.drag_child = child
+            child.on_click(env, x, y)
+
+    def child_at(self, x: int, y: int):
+        "return the topmost (i.e. last drawn) visible child at a point, if any"
+        for child in reversed(self.children):
+            if child.visible:
+                x0, y0, x1, y1 = child.geometry
+                if (x0 <= x < x1) and (y0 <= y < y1):
+                    return child
+        return None
 
     def on_drag(self, env: ControlEnvironment, x: int, y: int):
         """
@@ -232,11 +353,16 @@ class GridLayout(Control):
         """
         super().__init__(**style)
         self.min_cells = (min_cells_x, min_cells_y)
+        self.grid_max = self.min_cells
+        self.cell_children = {}
+        self.col_x = self.row_y = None
+        self.cell_key = None
         self.locate(0, 0)
 
     def put(self, grid_pos_x: int, grid_pos_y: int, grid_size_x: int, grid_size_y: int, control: Control):
         "put a child control on the grid, with a specific size, at a specific position "
         self.children.append(control)
+        control.parent = self
         control.grid_start_x = grid_pos_x
         control.grid_start_y = grid_pos_y
         control.grid_end_x = grid_pos_x + grid_size_x
@@ -245,6 +371,11 @@ class GridLayout(Control):
         self.next_grid_y = control.grid_start_y
         self.group_end_x = max(self.group_end_x, control.grid_end_x)
         self.group_end_y = max(self.group_end_y, control.grid_end_y)
+        self.grid_max = (max(self.grid_max[0], control.grid_end_x),
+                         max(self.grid_max[1], control.grid_end_y))
+        for y in range(control.grid_start_y, control.grid_end_y):
+            for x in range(control.grid_start_x, control.grid_end_x):
+                self.cell_children.setdefault((x, y), []).append(control)
         self.invalidate_layout()
         return control
 
@@ -280,33 +411,51 @@ class GridLayout(Control):
 
     def get_grid_max(self):
         "determine current grid size"
-        maxx, maxy = self.min_cells
-        for child in self.children:
-            maxx = max(maxx, child.grid_end_x)
-            maxy = max(maxy, child.grid_end_y)
-        return (maxx, maxy)
+        return self.grid_max
 
     def do_layout(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
         if not self.children: return
         maxx, maxy = self.get_grid_max()
-
-        # compute cell size (cs*) and actual grid start
-        margin  = env.scale(self.get('margin',  20))
-        padding = env.scale(self.get('padding', 15))
-        csx = ((x1 - x0) - 2 * margin - (maxx - 1) * padding) // maxx + padding
-        csy = ((y1 - y0) - 2 * margin - (maxy - 1) * padding) // maxy + padding
-        if not self.get('rectangular'):
-            csx = csy = min(csx, csy)
-        x0 = (x0 + x1 - csx * maxx + padding) // 2
-        y0 = (y0 + y1 - csy * maxy + padding) // 2
+        get, scale = self.get, env.control_scale
+        margin  = round(get('margin',  20) * scale)
+        padding = round(get('padding', 15) * scale)
+        rectangular = bool(get('rectangular'))
+
+        # the cell geometry only needs to be re-computed if any of its inputs
+        # changed (children are only ever appended, so their count suffices)
+        key = (x0, y0, x1, y1, maxx, maxy, margin, padding, rectangular, len(self.children))
+        if key != self.cell_key:
+            # compute cell size (cs*) and actual grid start
+            csx = ((x1 - x0) - 2 * margin - (maxx - 1) * padding) // maxx + padding
+            csy = ((y1 - y0) - 2 * margin - (maxy - 1) * padding) // maxy + padding
+            if not rectangular:
+                csx = csy = min(csx, csy)
+            x0 = (x0 + x1 - csx * maxx + padding) // 2
+            y0 = (y0 + y1 - csy * maxy + padding) // 2
+            col_x = self.col_x = [x0 + csx * i for i in range(maxx + 1)]
+            row_y = self.row_y = [y0 + csy * i for i in range(maxy + 1)]
+            self.child_rects = [(col_x[child.grid_start_x],
+                                 row_y[child.grid_start_y],
+                                 col_x[child.grid_end_x] - padding,
+                                 row_y[child.grid_end_y] - padding)
+                                for child in self.children]
+            self.cell_key = key
 
         # layout cells
-        for child in self.children:
-            child.layout(env,
-                x0 + csx * child.grid_start_x,
-                y0 + csy * child.grid_start_y,
-                x0 + csx * child.grid_end_x - padding,
-                y0 + csy * child.grid_end_y - padding)
+        for child, rect in zip(self.children, self.child_rects):
+            child.place(env, *rect)
+
+    def child_at(self, x: int, y: int):
+        # look up the grid cell first, then only check the children in it
+        if not self.col_x:
+            return super().child_at(x, y)
+        cell = (bisect.bisect_right(self.col_x, x) - 1, bisect.bisect_right(self.row_y, y) - 1)
+        for child in reversed(self.cell_children.get(cell, ())):
+            if child.visible:
+                x0, y0, x1, y1 = child.geometry
+                if (x0 <= x < x1) and (y0 <= y < y1):
+                    return child
+        return None
 
 ###############################################################################
 # MARK: TabSheet
@@ -358,20 +507,39 @@ class TabSheet(TextControl):
         if control.visible and any(c.visible for c in self.children):
             control.visible = False
         self.children.append(control)
+        control.parent = self
         control.tab_title = title
+        control.tab_title_cache = control.tab_label_cache = None
+        self.set_page_style(control, **style)
+        return control
+
+    def set_tab_title(self, page: Control, title: str):
+        "change the title of a page and take care that the layout is recomputed"
+        page.tab_title = title
+        self.invalidate_layout()
+
+    def set_page_style(self, page: Control, **style):
+        """change style parameters of a page (same as in add_page());
+        the colors are parsed here once, not during every layout"""
         for k, v in style.items():
-            control.style['tab_' + k] = v
+            page.set('tab_' + k, v)
+        page.tab_active_outline = color.parse(page.get('tab_outline', "#fff"))
+        page.tab_active_background = color.parse(page.get('tab_fill1', "#345"))
+        page.tab_active_color = color.parse(page.get('tab_color', "#fff"))
+        fill2 = page.get('tab_fill2')
+        page.tab_gradient = color.parse(fill2) if fill2 else page.tab_active_background
+        page.tab_label_color = color.parse(page.get('tab_label_color', "#fff1"))
         self.invalidate_layout()
-        return control
 
     def do_layout(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
         # vertical and "global" geometry
-        raw_text_size = self.get('size', 50)
-        padx = env.scale(self.get('padx', raw_text_size))
-        pady = env.scale(self.get('pady', raw_text_size // 2))
-        self.button_outline = env.scale(self.get('width', 3))
-        self.button_radius = env.scale(self.get('radius', 25))
-        self.button_text_size = env.scale(raw_text_size)
+        get, scale = self.get, env.control_scale
+        raw_text_size = get('size', 50)
+        padx = round(get('padx', raw_text_size) * scale)
+        pady = round(get('pady', raw_text_size // 2) * scale)
+        self.button_outline = round(get('width', 3) * scale)
+        self.button_radius = round(get('radius', 25) * scale)
+        self.button_text_size = round(raw_text_size * scale)
         self.button_text_y = y0 + self.button_outline + pady
         self.bar_y0 = self.button_text_y + self.button_text_size + pady
         self.bar_y1 = self.bar_y0 + self.button_outline
@@ -384,44 +552,59 @@ class TabSheet(TextControl):
 
         # horizontal geometry and per-page stuff
         fading = self.get('fading', 0.5)
+        self.tab_starts = []
         bx = x0
         for page in self.children:
-            env.renderer.set_font(page.get('tab_font'))
+            # (title widths and fitted label sizes are cached in the pages,
+            # as they only change if the text, size or font changes)
+            font = env.renderer.set_font(page.get('tab_font'))
+            key = (page.tab_title, self.button_text_size, font)
+            if not(page.tab_title_cache) or (page.tab_title_cache[0] != key):
+                page.tab_title_cache = (key, env.renderer.text_line_width(page.tab_title, self.button_text_size))
             page.tab_button_x0 = bx
+            self.tab_starts.append(bx)
             page.tab_button_text_x = bx + self.button_outline + padx
-            bx = page.tab_button_text_x + env.renderer.text_line_width(page.tab_title, self.button_text_size) + padx
+            bx = page.tab_button_text_x + page.tab_title_cache[1] + padx
             page.tab_button_x1 = bx + self.button_outline
 
             # colors
-            page.tab_active_outline = color.parse(page.get('tab_outline', "#fff"))
-            page.tab_active_background = color.parse(page.get('tab_fill1', "#345"))
-            page.tab_active_color = color.parse(page.get('tab_color', "#fff"))
-            fill2 = page.get('tab_fill2')
-            page.tab_gradient = color.parse(fill2) if fill2 else page.tab_active_background
             page.tab_inactive_outline    = color.scale(page.tab_active_outline,    fading)
             page.tab_inactive_background = color.scale(page.tab_active_background, fading)
             page.tab_inactive_color      = color.scale(page.tab_active_color,      fading)
+            page.tab_button_colors = {
+                True:  (page.tab_active_outline,   page.tab_active_background,   page.tab_active_color),
+                False: (page.tab_inactive_outline, page.tab_inactive_background, page.tab_inactive_color)}
 
             # label stuff
             label = page.get('tab_label')
             if label:
                 page.tab_label_font = page.get('tab_label_font', page.get('tab_font'))
-                env.renderer.set_font(page.tab_label_font)
+                font = env.renderer.set_font(page.tab_label_font)
                 raw_text_size = page.get('tab_label_size', 200)
-                lpadx = env.scale(page.get('tab_padx', raw_text_size // 6))
-                lpady = env.scale(page.get('tab_pady', 0))
+                lpadx = round(page.get('tab_padx', raw_text_size // 6) * scale)
+                lpady = round(page.get('tab_pady', 0) * scale)
                 max_height = page_height - 2 * lpady
                 max_width = page_width - 2 * lpadx
-                size = env.scale(raw_text_size)
-                while size > 1:
+                size = round(raw_text_size * scale)
+                key = (label, font, size, max_width, max_height)
+                if not(page.tab_label_cache) or (page.tab_label_cache[0] != key):
                     height = env.renderer.text_line_height(size)
                     width = env.renderer.text_line_width(label, size)
-                    page.tab_label_x = self.page_x1 - lpadx - width
-                    page.tab_label_y = self.page_y1 - lpady - height
-                    if (width < max_width) and (height < max_height): break
-                    size = min(round(size * 0.9), size - 1)
+                    if not((width < max_width) and (height < max_height)) and (width > 0) and (height > 0):
+                        # text metrics are linear in the size, so the fitting
+                        # size can be computed directly; it only needs to be
+                        # verified (and possibly decremented) due to rounding
+                        size = max(1, min(size - 1, int(size * min(max_width / width, max_height / height))))
+                        while size > 1:
+                            height = env.renderer.text_line_height(size)
+                            width = env.renderer.text_line_width(label, size)
+                            if (width < max_width) and (height < max_height): break
+                            size -= 1
+                    page.tab_label_cache = (key, size, width, height)
+                _, size, width, height = page.tab_label_cache
+                page.tab_label_x = self.page_x1 - lpadx - width
+                page.tab_label_y = self.page_y1 - lpady - height
                 page.tab_label_size = size
-                page.tab_label_color = color.parse(page.get('tab_label_color', "#fff1"))
             else:
                 page.tab_label_size = 0
         if self.text:
@@ -431,20 +614,18 @@ class TabSheet(TextControl):
 
         # layout children
         for page in self.children:
-            page.layout(env, x0, self.bar_y1, x1, y1)
+            page.place(env, x0, self.bar_y1, x1, y1)
 
     def _draw_button(self, env: ControlEnvironment, page: Control, y0: int):
+        outline, background, text_color = page.tab_button_colors[bool(page.visible)]
         env.renderer.outline_box(
             page.tab_button_x0, y0, page.tab_button_x1, self.button_y1, 
-            self.button_outline,
-            page.tab_active_outline    if page.visible else page.tab_inactive_outline,
-            page.tab_active_background if page.visible else page.tab_inactive_background,
+            self.button_outline, outline, background,
             radius=self.button_radius)
         env.renderer.set_font(page.get('tab_font'))
         env.renderer.text_line(
             page.tab_button_text_x, self.button_text_y,
-            self.button_text_size, page.tab_title,
-            page.tab_active_color      if page.visible else page.tab_inactive_color)
+            self.button_text_size, page.tab_title, text_color)
 
     def do_draw(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
         current_page = None
@@ -465,14 +646,12 @@ class TabSheet(TextControl):
         self._draw_button(env, current_page, y0)
         # page outline (if any) - drawn as lines to save on rasterized area
         if self.button_outline:
-            c = current_page.tab_active_outline
-            if x0 < current_page.tab_button_x0:
-                env.renderer.box(x0, self.bar_y0, current_page.tab_button_x0 + self.button_outline, self.bar_y1, c)
-            if current_page.tab_button_x1 < x1:
-                env.renderer.box(current_page.tab_button_x1 - self.button_outline, self.bar_y0, x1, self.bar_y1, c)
-            env.renderer.box(x0, self.bar_y0, self.page_x0, y1, c)
-            env.renderer.box(self.page_x1, self.bar_y0, x1, y1, c)
-            env.renderer.box(x0, self.page_y1, x1, y1, c)
+            env.renderer.frame(
+                x0, self.bar_y0, x1, y1,
+                self.page_x0, self.bar_y1, self.page_x1, self.page_y1,
+                current_page.tab_active_outline,
+                current_page.tab_button_x0, current_page.tab_button_x1,
+                self.button_outline)
         # page background
         env.renderer.box(
             self.page_x0, self.bar_y1, self.page_x1, self.page_y1,
@@ -488,21 +667,21 @@ class TabSheet(TextControl):
     def on_click(self, env: ControlEnvironment, x: int, y: int):
         self.click_x, self.click_y = x, y
         if self.geometry[1] <= y < self.bar_y1:
-            prev_page = next_page = None
+            # the tab buttons are sorted by (and slightly overlap at) their
+            # start coordinate, so the rightmost one starting left of x wins
+            idx = bisect.bisect_right(self.tab_starts, x) - 1
+            if (idx < 0) or not(x < self.children[idx].tab_button_x1):
+                return
+            next_page = self.children[idx]
             for page in self.children:
                 if page.visible:
-                    prev_page = page
-                if page.tab_button_x0 <= x < page.tab_button_x1:
-                    next_page = page
-            if next_page:
-                if prev_page: prev_page.visible = False
-                next_page.visible = True
+                    page.visible = False
+            next_page.visible = True
         else:
-            for child in self.children:
-                x0, y0, x1, y1 = child.geometry
-                if child.visible and (x0 <= x < x1) and (y0 <= y < y1):
-                    self.drag_child = child
-                    child.on_click(env, x, y)
+            child = self.child_at(x, y)
+            if child:
+                self.drag_child = child
+                child.on_click(env, x, y)
 
 ###############################################################################
 # MARK: Label
@@ -528,18 +707,23 @@ class Label(TextControl):
         super().__init__(text, **style)
 
     def do_layout(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
-        env.renderer.set_font(self.get('font'))
-        font_size = env.scale(self.get('size', 50))
+        get, scale = self.get, env.control_scale
+        env.renderer.set_font(get('font'))
+        font_size = round(get('size', 50) * scale)
         self.text_layout = env.renderer.fit_text_in_box(
             x0, y0, x1, y1, font_size, self.text,
-            self.get('halign', 2), self.get('valign', 2))
+            get('halign', 2), get('valign', 2))
         bar_keepout = font_size // 3
-        self.bar_left  = min(x0 for x0,y0,x1,y1,size,line in self.text_layout) - bar_keepout
-        self.bar_right = max(x1 for x0,y0,x1,y1,size,line in self.text_layout) + bar_keepout
-        self.bar_width = env.scale(self.get('bar', 0))
+        text_x0, _, text_x1, _, _, _ = self.text_layout[0]
+        for lx0, _, lx1, _, _, _ in self.text_layout:
+            if lx0 < text_x0: text_x0 = lx0
+            if lx1 > text_x1: text_x1 = lx1
+        self.bar_left  = text_x0 - bar_keepout
+        self.bar_right = text_x1 + bar_keepout
+        self.bar_width = round(get('bar', 0) * scale)
         self.bar_y0 = round((self.text_layout[0][1] + self.text_layout[-1][3] - self.bar_width) * 0.5)
         self.bar_y1 = self.bar_y0 + self.bar_width
-        self.color = color.parse(self.get('color', "fffc"))
+        self.color = color.parse(get('color', "fffc"))
 
     def do_draw(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
         env.renderer.set_font(self.get('font'))
@@ -561,6 +745,9 @@ class Button(TextControl):
 
     default_delay = 1
 
+    # state after a click, indexed by [is toggle button][currently has a state]
+    next_click_state = (('active', 'active'), ('active', None))
+
     def __init__(self, text, cmd=None, **style):
         """
         Instantiate the button with the following (mostly optional) parameters:
@@ -600,67 +787,89 @@ class Button(TextControl):
         """
         super().__init__(text, **style)
         self.cmd = cmd
-        self.delayed_click = None
+        self.draw_style_source = None
 
         # set colors based on Oklch values
         h = self.get('hue', 30)
         c = self.get('sat', 0.0)
         l = self.get('light', 0.75)
-        lab_text = color.tooklab(color.parse(self.get('color', "000")))
+        text = color.parse(self.get('color', "000"))
+        key = (h, c, l, text)
+        colors = self._color_cache.get(key)
+        if not colors:
+            colors = self._color_cache[key] = self._make_colors(h, c, l, text)
+        for k, v in colors.items():
+            self.weak_set(k, v)
+
+    # derived colors for each (hue, sat, light, text color) combination
+    _color_cache = {}
+
+    @staticmethod
+    def _make_colors(h: float, c: float, l: float, text):
+        "compute the derived default colors for the major button states"
+        lab_text = color.tooklab(text)
         lab_light = color.lch2lab(1.0, 0.04, 100)
         t_light = 0.9
         lab_outline = color.lch2lab(l * 0.5,  c * 0.5, h)
         lab_fill1   = color.lch2lab(l + 0.05, c, h)
         lab_fill2   = color.lch2lab(l - 0.05, c, h)
-        self.weak_set('outline', color.oklab(*lab_outline))
-        self.weak_set('fill1',   color.oklab(*lab_fill1))
-        self.weak_set('fill2',   color.oklab(*lab_fill2))
-        self.weak_set('disabled_outline', color.oklch(l * 0.3, c * 0.25, h))
-        self.weak_set('disabled_fill1',   color.oklch(l * 0.6 + 0.05, c * 0.5, h))
-        self.weak_set('disabled_fill2',   color.oklch(l * 0.6 - 0.05, c * 0.5, h))
-        self.weak_set('active_outline', color.oklab(*color.lerp(lab_outline, lab_light, t_light * 0.5)))
-        self.weak_set('active_fill1',   color.oklab(*color.lerp(lab_fill1,   lab_light, t_light)))
-        self.weak_set('active_fill2',   color.oklab(*color.lerp(lab_fill2,   lab_light, t_light)))
-        self.weak_set('active_color',   color.oklab(*color.lerp(lab_text,    lab_light, t_light * 0.25)))
+        return {
+            'outline': color.oklab(*lab_outline),
+            'fill1':   color.oklab(*lab_fill1),
+            'fill2':   color.oklab(*lab_fill2),
+            'disabled_outline': color.oklch(l * 0.3, c * 0.25, h),
+            'disabled_fill1':   color.oklch(l * 0.6 + 0.05, c * 0.5, h),
+            'disabled_fill2':   color.oklch(l * 0.6 - 0.05, c * 0.5, h),
+            'active_outline': color.oklab(*color.lerp(lab_outline, lab_light, t_light * 0.5)),
+            'active_fill1':   color.oklab(*color.lerp(lab_fill1,   lab_light, t_light)),
+            'active_fill2':   color.oklab(*color.lerp(lab_fill2,   lab_light, t_light)),
+            'active_color':   color.oklab(*color.lerp(lab_text,    lab_light, t_light * 0.25)),
+        }
 
     @property
     def active(self):
         return (self.state == 'active')
 
     def do_layout(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
-        self.border = env.scale(self.get('border', 3))
-        self.shadow = env.scale(self.get('shadow', 15))
-        self.radius = env.scale(self.get('radius', 25))
-        env.renderer.set_font(self.get('font'))
+        get, scale = self.get, env.control_scale
+        border = self.border = round(get('border', 3) * scale)
+        self.shadow = round(get('shadow', 15) * scale)
+        self.radius = round(get('radius', 25) * scale)
+        env.renderer.set_font(get('font'))
         self.text_layout = env.renderer.fit_text_in_box(
-            x0 + self.border * 1.5, y0 + self.border,
-            x1 - self.border * 1.5, y1 - self.border,
-            env.scale(self.get('size', 50)), self.text,
-            self.get('halign', 2), self.get('valign', 2))
+            x0 + border * 1.5, y0 + border,
+            x1 - border * 1.5, y1 - border,
+            round(get('size', 50) * scale), self.text,
+            get('halign', 2), get('valign', 2))
 
     def do_draw(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
-        # delayed click handler
-        if self.delayed_click:
-            self.delayed_click -= 1
-        if self.delayed_click == 0:
-            self.delayed_click = None
-            if self.cmd:
-                util.safecall(self.cmd, env, self)
-            if not self.get('toggle'):
-                self.state = None
+        # fetch the drawing styles, but only if the resolved style changed
+        style = self._resolved or self._resolve_style()
+        if style is not self.draw_style_source:
+            self.draw_style_source = style
+            self.draw_style = (style.get('outline', "666"), style.get('fill1', "aaa"), style.get('fill2', "ccc"),
+                               style.get('font'), style.get('color', "000"))
+        outline, fill1, fill2, font, text_color = self.draw_style
 
         # actual drawing
         env.renderer.outline_box(
             x0,y0, x1,y1, self.border,
-            colorO=self.get('outline', "666"),
-            colorU=self.get('fill1', "aaa"),
-            colorL=self.get('fill2', "ccc"),
+            colorO=outline,
+            colorU=fill1,
+            colorL=fill2,
             radius=self.radius,
             shadow_offset=self.shadow*0.25,
             shadow_blur=self.shadow,
             shadow_grow=self.shadow)
-        env.renderer.set_font(self.get('font'))
-        env.renderer.fitted_text(self.text_layout, self.get('color', "000"))
+        env.renderer.set_font(font)
+        env.renderer.fitted_text(self.text_layout, text_color)
+
+    def on_delayed_click(self, env: ControlEnvironment):
+        "handle a click that has been queued with env.schedule_click()"
+        if self.cmd:
+            util.safecall(self.cmd, env, self)
+        if not self.get('toggle'):
+            self.state = None
 
     def on_click(self, env: ControlEnvironment, x: int, y: int):
         if self.get('manual'):
@@ -671,7 +880,7 @@ class Button(TextControl):
             return
         # queue handling of the click in the next frame
         # (so the visual state change can be seen)
-        self.state = 'active' if (not(self.state) or not(self.get('toggle'))) else None
+        self.state = self.next_click_state[bool(self.get('toggle'))][bool(self.state)]
         delay = self.get('delay', self.default_delay) + 1
-        self.delayed_click = delay
+        env.schedule_click(self, delay)
         env.window.request_frames(delay)
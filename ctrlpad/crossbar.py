@@ -1,8 +1,12 @@
 # SPDX-FileCopyrightText: 2024 Martin J. Fiedler <keyj@emphy.de>
 # SPDX-License-Identifier: MIT
 
+import errno
+import functools
+import itertools
 import logging
 import re
+import selectors
 import socket
 import threading
 import time
@@ -21,6 +25,8 @@ __all__ = [
     'GefenCrossbar',
 ]
 
+_GEOM_RE = re.compile(rb'(\d+)[xX](\d+)')
+
 ###############################################################################
 
 class Crossbar:
@@ -32,11 +38,16 @@ class Crossbar:
     default_input_name_scheme  = '1'  # '1' = numbers, 'A' = letters
     default_output_name_scheme = '1'  # '1' = numbers, 'A' = letters
 
+    # simulated tie duration of the base class's dummy on_tie(), in seconds
+    fake_latency = 0.0
+
     def __init__(self, num_inputs: int = 0, num_outputs: int = 0, name: str = None):
         self.num_inputs  = num_inputs  or self.default_num_inputs
         self.num_outputs = num_outputs or self.default_num_outputs
         self.log = logging.getLogger(name or self.__class__.__name__)
         self.result = None
+        self.result_event = threading.Event()
+        self.active_input = None
 
     @staticmethod
     def str2int(s):
@@ -54,10 +65,11 @@ class Crossbar:
         elements: the input number, followed by one or more output numbers.
         Note that input and output numbers are one-based.
         """
+        ni, no = self.num_inputs, self.num_outputs
         ties = [tie for tie in (tuple(map(self.str2int, raw_tie)) for raw_tie in ties) \
                 if (len(tie) > 1) \
-                and     (0 < tie[0] <= self.num_inputs) \
-                and all((0 < out    <= self.num_outputs) for out in tie[1:])]
+                and (0 < tie[0] <= ni) \
+                and (0 < min(tie[1:])) and (max(tie[1:]) <= no)]
         if not ties: return
         self.log.info("TIE: %r", ties)
         self.on_tie(ties)
@@ -67,7 +79,8 @@ class Crossbar:
         'ties' is guaranteed to be non-empty, and each entry is guaranteed to
         be valid (at least one output, no invalid input/output numbers)
         """
-        time.sleep(0.02)  # act as if tying takes some time
+        if self.fake_latency:
+            time.sleep(self.fake_latency)  # act as if tying takes some time
 
     @staticmethod
     def flatten_ties(ties):
@@ -79,21 +92,20 @@ class Crossbar:
     def clear_status(self):
         "clear the last command's status"
         self.result = None
+        self.result_event.clear()
     def notify_success(self):
         "set the last command's status to 'success'"
         self.result = True
+        self.result_event.set()
     def notify_error(self):
         "set the last command's status to 'error'"
         self.result = False
+        self.result_event.set()
 
     def wait(self, timeout=None):
-        "wait until an asynchronous command completed and return its status"
-        t1 = None
-        while self.result is None:
-            if timeout:
-                if not t1: t1 = time.time() + timeout
-                elif time.time() > t1: break
-            time.sleep(0.05)
+        """wait until an asynchronous command completed and return its status;
+        a timeout of None waits indefinitely, a timeout of 0 only polls"""
+        self.result_event.wait(timeout)
         return self.result
 
     def geometry_known(self) -> bool:
@@ -108,8 +120,8 @@ class Crossbar:
     def set_geometry_str(self, s: str):
         """set the number of inputs and outputs, if not already set,
         from a string containing a substring like '8x16'"""
-        if isinstance(s, bytes): s = s.decode('ascii', 'replace')
-        if m := re.search(r'(\d+)[xX](\d+)', s):
+        if isinstance(s, str): s = s.encode('ascii', 'replace')
+        if m := _GEOM_RE.search(s):
             self.set_geometry(*map(int, m.groups()))
 
 ###############################################################################
@@ -165,6 +177,8 @@ class Crossbar:
             Button(self.schemed_name(input_scheme or self.default_input_name_scheme, i, input_names, input_format),
                    manual=True, cmd=self._on_in_btn_click))
             for i in range(1, self.num_inputs+1)]
+        for i, btn in enumerate(self.btn_in, 1):
+            btn.crossbar_input = i
         page.add_group_label("INPUTS")
 
         page.locate(0,4)
@@ -191,22 +205,24 @@ class Crossbar:
         return parent.add_page(self.create_ui(*args, **kwargs), title or self.log.name.split('-', 1)[0])
 
     def _clear_buttons(self):
-        for btn in self.btn_in:  btn.state = None
-        for btn in self.btn_out: btn.state = None
+        self.active_input = None
+        for btn in itertools.chain(self.btn_in, self.btn_out):
+            if btn.state is not None: btn.state = None
 
     def _on_in_btn_click(self, env: ControlEnvironment, btn: Control):
         was_active = btn.state
         self._clear_buttons()
-        if not was_active: btn.state = 'active'
+        if not was_active:
+            btn.state = 'active'
+            self.active_input = btn.crossbar_input
 
     def _on_cancel_click(self, env: ControlEnvironment, btn: Control):
         self._clear_buttons()
 
     def _on_take_click(self, env: ControlEnvironment, btn: Control):
-        tie = [i for i, btn in enumerate(self.btn_in, 1) if btn.state]
-        if len(tie) == 1:
-            tie += [i for i, btn in enumerate(self.btn_out, 1) if btn.state]
-            self.tie(tie)
+        # (only one input can be active at a time, and it is tracked directly)
+        if self.active_input:
+            self.tie([self.active_input] + [i for i, btn in enumerate(self.btn_out, 1) if btn.state])
         self._clear_buttons()
 
 ###############################################################################
@@ -215,6 +231,18 @@ class TCPIPCrossbar(Crossbar):
     "base class for controlling video matrices via TCP/IP"
     default_port = 0  # overridden in derived classes
 
+    # send() errors that indicate a dead connection (and warrant a reconnect);
+    # the last three are also what failed keepalive probes report
+    connection_lost_errors = {errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED, errno.ENOTCONN, errno.ESHUTDOWN, errno.EBADF,
+                              errno.ETIMEDOUT, errno.EHOSTUNREACH, errno.ENETUNREACH}
+
+    # delay between failed connection attempts (doubled after each failure)
+    reconnect_delay_min = 0.25
+    reconnect_delay_max = 5.0
+
+    # TCP keepalive settings (idle time, probe interval, probe count)
+    keepalive = (30, 10, 3)
+
     def __init__(self, ip: str, port: int = 0, num_inputs: int = 0, num_outputs: int = 0, timeout: float = 0.1, name: str = None):
         super().__init__(num_inputs, num_outputs, name=(name or (self.__class__.__name__.replace("Crossbar","") + "-" + ip)))
         self.ip = ip
@@ -223,37 +251,85 @@ class TCPIPCrossbar(Crossbar):
         self.timeout = timeout
         self.sock = None
         self.cancel = False
+        self.connection_lost = False
         self.receiver = None
+        self.wakeup = None
+        self.reconnect_at = 0.0
+        self.reconnect_delay = self.reconnect_delay_min
         self.connect()
 
     def _receiver_thread(self):
-        buf = b''
+        buf = bytearray()
+        sock = self.sock
         self.log.debug("receiver thread started")
+        sel = selectors.DefaultSelector()
+        wakeup = self.wakeup[0]
+        sel.register(sock, selectors.EVENT_READ)
+        sel.register(wakeup, selectors.EVENT_READ)
         while not self.cancel:
+            # block until data arrives or disconnect() wakes us up
+            ready = [key.fileobj for key, events in sel.select()]
+            if wakeup in ready:
+                try:
+                    wakeup.recv(256)
+                except EnvironmentError:
+                    pass
+                continue
             try:
-                buf += self.sock.recv(1024).replace(b'\r', b'\n')
-            except EnvironmentError:
-                pass
-            while b'\n' in buf:
-                line, buf = buf.split(b'\n', 1)
-                if line:
+                data = sock.recv(65536)
+            except EnvironmentError as e:
+                if e.errno not in self.connection_lost_errors:
+                    continue
+                data = b''
+            if not data:
+                # connection closed by the device; only flag this here, the
+                # actual teardown and reconnect is done by the next send()
+                self.log.error("connection closed by device")
+                self.connection_lost = True
+                self.result_event.set()  # wake up a pending wait()
+                break
+            buf += data.replace(b'\r', b'\n')
+            start = 0
+            while (end := buf.find(b'\n', start)) >= 0:
+                if end > start:
+                    line = bytes(buf[start:end])
                     self.log.debug("RECV %r", line)
                     self.on_receive(line)
+                start = end + 1
+            del buf[:start]
+        sel.close()
         self.log.debug("receiver thread exited (cancel=%r)", self.cancel)
 
     def connect(self):
         "establish a connection to the device"
+        if self.connection_lost:
+            self.disconnect()  # clean up after a connection closed by the device
         if self.sock: return
+        now = time.monotonic()
+        if now < self.reconnect_at:
+            return self.log.debug("previous connection attempt failed, not retrying yet")
         self.log.info("connecting to %s:%d", self.ip, self.port)
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
             self.sock.settimeout(self.timeout)
             self.sock.connect((self.ip, self.port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for opt, value in zip(("TCP_KEEPIDLE", "TCP_KEEPINTVL", "TCP_KEEPCNT"), self.keepalive):
+                if hasattr(socket, opt):  # not available on all platforms
+                    self.sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), value)
         except EnvironmentError as e:
             self.log.error("connection failed - %s", str(e))
             self.sock = None
+            self.reconnect_at = now + self.reconnect_delay
+            self.reconnect_delay = min(self.reconnect_delay * 2, self.reconnect_delay_max)
             return
+        self.reconnect_at = 0.0
+        self.reconnect_delay = self.reconnect_delay_min
         self.cancel = False
+        self.connection_lost = False
+        self.wakeup = socket.socketpair()
+        for s in self.wakeup: s.setblocking(False)
         self.receiver = threading.Thread(target=self._receiver_thread, name=self.log.name+"-ReceiverThread")
         self.receiver.daemon = True
         self.receiver.start()
@@ -265,8 +341,12 @@ class TCPIPCrossbar(Crossbar):
         if not self.sock: return
         self.cancel = True
         self.on_disconnect()
+        self.wakeup[1].send(b'x')
         self.receiver.join(self.timeout * 2)
         self.receiver = None
+        for s in self.wakeup: s.close()
+        self.wakeup = None
+        self.sock.close()
         self.sock = None
         self.log.info("disconnected from %s:%d", self.ip, self.port)
 
@@ -275,38 +355,41 @@ class TCPIPCrossbar(Crossbar):
 
     def send(self, data, allow_reconnect=True, wait=True):
         "send a command, and optionally wait for a response"
-        if not self.sock:
-            self.connect()
-            res = self.wait(self.timeout)
-            if self.sock and not(res):
-                self.log.error("reconnect didn't succeed, trying to send anyway")
-            if not self.sock:
-                self.log.error("reconnect attempt failed, can't send command")
-                return False
-        self.clear_status()
         if isinstance(data, str):
             data = data.encode('ascii', 'replace')
-        self.log.debug("SEND %r", data)
-        try:
-            self.sock.sendall(data)
-        except EnvironmentError as e:
-            if allow_reconnect:
-                self.log.error("connection lost (%s), reconnecting and retrying", str(e))
-                self.disconnect()
-                return self.send(data, allow_reconnect=False, wait=wait)
-            else:
+        for retry in ((True, False) if allow_reconnect else (False,)):
+            if self.connection_lost or not(self.sock):
+                self.connect()
+                if not self.sock:
+                    self.log.error("reconnect attempt failed, can't send command")
+                    return False
+                if not self.wait(self.timeout):
+                    self.log.error("reconnect didn't succeed, trying to send anyway")
+            self.clear_status()
+            self.log.debug("SEND %r", data)
+            sock = self.sock
+            try:
+                sock.sendall(data)
+            except EnvironmentError as e:
+                if e.errno not in self.connection_lost_errors:
+                    self.log.error("failed to send data (%s)", str(e))
+                    return False
+                if retry:
+                    self.log.error("connection lost (%s), reconnecting and retrying", str(e))
+                    self.disconnect()
+                    continue
                 self.log.error("connection lost (%s)", str(e))
                 self.disconnect()
                 return False
-        if wait:
+            if not wait:
+                return None
             res = self.wait(self.timeout)
             if res is None:
-                if allow_reconnect:
+                if retry:
                     self.log.error("no reaction from device, reconnecting and retrying")
                     self.disconnect()
-                    return self.send(data, allow_reconnect=False, wait=wait)
-                else:
-                    self.log.error("no reaction from device")
+                    continue
+                self.log.error("no reaction from device")
             elif not res:
                 self.log.error("device reports error")
             return res
@@ -430,8 +513,14 @@ class LightwareCrossbar(TCPIPCrossbar):
                 self.set_geometry_str(line)
             self.notify_success()
 
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def tie_command(ties: tuple) -> bytes:
+        "build the command string for a tuple of ties"
+        return b''.join([b'{%d@%d}\r\n' % tie for tie in Crossbar.flatten_ties(ties)])
+
     def on_tie(self, ties):
-        self.send(b''.join(b'{%d@%d}\r\n' % tie for tie in self.flatten_ties(ties)))
+        self.send(self.tie_command(tuple(ties)))
 
 class ExtronCrossbar(TCPIPCrossbar):
     "crossbar switch using the Extron DXP SIS protocol"
@@ -445,19 +534,31 @@ class ExtronCrossbar(TCPIPCrossbar):
         else:
             self.notify_success()
 
+    # (lowercase) prefixes of success responses, indexed by their first character
+    success_prefixes = {ord('l'): b"login ", ord('q'): b"qik", ord('o'): b"out"}
+
     def on_receive(self, line):
-        line = line.lower()
-        if line.startswith((b"login ", b"qik", b"out")):
-            self.notify_success()
-        elif line.startswith(b'v') and line[1:2].isdigit() and (b' a' in line):
+        # dispatch on the (case-folded) first character, so that only the
+        # prefix in question needs to be lowercased
+        first = line[0] | 0x20
+        prefix = self.success_prefixes.get(first)
+        if prefix:
+            if line[:len(prefix)].lower() == prefix:
+                self.notify_success()
+        elif (first == ord('v')) and line[1:2].isdigit() and ((b' a' in line) or (b' A' in line)):
             self.set_geometry_str(line)
             self.notify_success()
 
-    def on_tie(self, ties):
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def tie_command(ties: tuple) -> bytes:
+        "build the command string for a tuple of ties"
         if (len(ties) == 1) and (len(ties[0]) == 2):
-            self.send(b'%d*%d!' % (ties[0][0], ties[0][1]))
-        else:
-            self.send(b'\x1b+Q' + b''.join(b'%d*%d!' % tie for tie in self.flatten_ties(ties)) + b'\r\n')
+            return b'%d*%d!' % ties[0]
+        return b'\x1b+Q' + b''.join([b'%d*%d!' % tie for tie in Crossbar.flatten_ties(ties)]) + b'\r\n'
+
+    def on_tie(self, ties):
+        self.send(self.tie_command(tuple(ties)))
 
 class ExtronSerialCrossbar(SerialCrossbar):
     default_num_inputs = 8
@@ -465,10 +566,7 @@ class ExtronSerialCrossbar(SerialCrossbar):
 
     def on_tie(self, ties):
         self.discard_input()
-        if (len(ties) == 1) and (len(ties[0]) == 2):
-            self.send(b'%d*%d!' % (ties[0][0], ties[0][1]))
-        else:
-            self.send(b'\x1b+Q' + b''.join(b'%d*%d!' % tie for tie in self.flatten_ties(ties)) + b'\r\n')
+        self.send(ExtronCrossbar.tie_command(tuple(ties)))
 
 class GefenCrossbar(SerialCrossbar):
     "crossbar switch using the Gefen DVI Matrix RS232 protocol"
@@ -376,15 +376,16 @@ class MPDControl(Control):
         self.curr_songid = -1
 
     def do_layout(self, env: ControlEnvironment, x0: int, y0: int, x1: int, y1: int):
-        self.bg_color = color.parse(self.get('background', "111"))
-        self.bg_radius = env.scale(self.get('radius', 20))
-        self.c_text = color.parse(self.get('color', "fff"))
-        self.c_icon = color.parse(self.get('icons', "888"))
-        self.c_time = color.parse(self.get('time_color', "ccc"))
-        c = color.parse(self.get('buttons', "fff"))
-        self.c_buttons = [color.alpha(c, self.get('alpha', 0.5)), c]
-        base_size = env.scale(self.get('size', 50))
-        margin = env.scale(self.get('margin', 20))
+        get, scale = self.get, env.control_scale
+        self.bg_color = color.parse(get('background', "111"))
+        self.bg_radius = round(get('radius', 20) * scale)
+        self.c_text = color.parse(get('color', "fff"))
+        self.c_icon = color.parse(get('icons', "888"))
+        self.c_time = color.parse(get('time_color', "ccc"))
+        c = color.parse(get('buttons', "fff"))
+        self.c_buttons = [color.alpha(c, get('alpha', 0.5)), c]
+        base_size = round(get('size', 50) * scale)
+        margin = round(get('margin', 20) * scale)
         x0 += margin
         y0 += margin
         x1 -= margin
@@ -401,7 +402,7 @@ class MPDControl(Control):
             ))
         env.renderer.set_font(self.get('font'))
         text_x0 = max(x1 for x0,y0,x1,y1,sz,tx in self.icon_layout) \
-                + env.scale(self.get('icondist', 20))
+                + round(get('icondist', 20) * scale)
         self.text_layout = []
         for item in self.text:
             self.text_layout.extend(env.renderer.fit_text_in_box(
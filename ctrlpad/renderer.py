@@ -272,6 +272,7 @@ class Renderer:
     batch_size = 65536 // (vertex_size * 4)
     vbo_items_per_quad = vertex_attrib_count * 4
     max_vbo_items = batch_size * vbo_items_per_quad
+    fit_cache_max_size = 1024
 
     def __init__(self):
         self.prog = GLProgram(_rendershader)
@@ -300,6 +301,8 @@ class Renderer:
         self.fonts = {}
         self.default_font = NullFont(self.atlas)
         self.font = self.default_font
+        self.font_request = None
+        self.fit_cache = {}
         self.max_nquads = self.max_nbatches = 0
 
     def begin_frame(self, viewport_width: int, viewport_height: int):
@@ -357,10 +360,14 @@ class Renderer:
         self.fonts[self.font.name] = self.font
         if not self.default_font:
             self.default_font = self.font
+        self.font_request = self.font
         return self.font.name
 
     def set_font(self, font):
         "set the font for the next draw calls (by name or instance)"
+        if font is self.font_request:
+            return self.font
+        self.font_request = font
         if not font:
             self.font = self.default_font
         elif isinstance(font, str):
@@ -395,6 +402,59 @@ class Renderer:
             x1, y1,   w,  h, 0.0,  w,  h,  r, offset,   s, *colorL,
         ])
 
+    def boxes(self, coords, colors, radius=0.0, blur=1.0, offset=0.0):
+        """
+        Draw multiple rounded rectangles or circles with a common radius at once.
+        - coords = flat sequence of x0,y0,x1,y1 coordinates, four per box
+                   (e.g. an array.array)
+        - colors = sequence of fill colors, one for each box
+        - radius, blur, offset = same as in box()
+        """
+        s = 1.0 / max(blur, 1.0/256)
+        finalized = {}
+        max_items = self.max_vbo_items
+        data = self.data
+        it = iter(coords)
+        for x0, y0, x1, y1, c in zip(it, it, it, it, colors):
+            fc = finalized.get(id(c))
+            if fc is None:
+                fc = finalized[id(c)] = color.finalize(c)
+            if len(data) >= max_items:
+                self.flush()
+                data = self.data
+            w = (x1 - x0) * 0.5
+            h = (y1 - y0) * 0.5
+            r = min(min(w, h), radius)
+            data.extend([
+                x0, y0,  -w, -h, 0.0,  w,  h,  r, offset,   s, *fc,
+                x1, y0,   w, -h, 0.0,  w,  h,  r, offset,   s, *fc,
+                x0, y1,  -w,  h, 0.0,  w,  h,  r, offset,   s, *fc,
+                x1, y1,   w,  h, 0.0,  w,  h,  r, offset,   s, *fc,
+            ])
+
+    def frame(self, x0, y0, x1, y1, ix0, iy0, ix1, iy1, color_, gap_x0=None, gap_x1=None, gap_overlap=0):
+        """
+        Draw a rectangular frame, i.e. the area between two rectangles.
+        - x0,y0,x1,y1     = outer rectangle
+        - ix0,iy0,ix1,iy1 = inner rectangle (left open)
+        - color_          = fill color
+        - gap_x0,gap_x1   = horizontal range of an opening in the upper edge
+                            (e.g. for an attached tab), or None
+        - gap_overlap     = amount by which the upper edge extends into the
+                            opening (edge strips are only drawn if there's
+                            space between the opening and the outer rectangle)
+        """
+        coords = []
+        if gap_x0 is None:
+            coords.extend((x0, y0, x1, iy0))
+        else:
+            if x0 < gap_x0: coords.extend((x0, y0, gap_x0 + gap_overlap, iy0))
+            if gap_x1 < x1: coords.extend((gap_x1 - gap_overlap, y0, x1, iy0))
+        if x0 < ix0: coords.extend((x0, y0, ix0, y1))
+        if ix1 < x1: coords.extend((ix1, y0, x1, y1))
+        if iy1 < y1: coords.extend((x0, iy1, x1, y1))
+        self.boxes(coords, (color_,) * (len(coords) // 4))
+
     def outline_box(self, x0, y0, x1, y1, width, colorO, colorU, colorL=None, radius=0.0, shadow_offset=0.0, shadow_blur=0.0, shadow_alpha=1.0, shadow_grow=0.0):
         """
         Draw a rounded rectangle or circle with an outline and optional drop shadow.
@@ -527,7 +587,24 @@ class Renderer:
         - line_spacing = relative scaling factor for the line height
         The result is *not* drawn right away; instead, a list of
         (x0,y0, x1,y1, size, line) tuples is generated that can be used to draw later.
+        Results are memoized, as controls are often re-layouted with
+        unchanged geometry and text.
         """
+        key = (self.font, x0, y0, x1, y1, initial_size, text, halign, valign, line_spacing, min_size)
+        try:
+            return list(self.fit_cache[key])
+        except KeyError:
+            pass
+        except TypeError:
+            key = None
+        res = self._fit_text_in_box(x0, y0, x1, y1, initial_size, text, halign, valign, line_spacing, min_size)
+        if key:
+            if len(self.fit_cache) >= self.fit_cache_max_size:
+                self.fit_cache.clear()
+            self.fit_cache[key] = tuple(res)
+        return res
+
+    def _fit_text_in_box(self, x0, y0, x1, y1, initial_size, text, halign, valign, line_spacing, min_size):
         sx = x1 - x0
         sy = y1 - y0
         # find minimum size where text fits the box
@@ -133,6 +133,10 @@ class GLAppWindow:
     size at all times.
     """
 
+    # set to False in derived classes that don't change anything visible
+    # in on_mouse_motion(), to avoid redrawing the screen on mouse moves
+    redraw_on_mouse_motion = True
+
     _keysyms = {  # SDL2 keysym-to-keyname mappings for non-ASCII keys
         8:  "BACKSPACE",
         9:  "TAB",
@@ -252,6 +256,7 @@ class GLAppWindow:
         self._fps_limit = fps_limit
         self._requested_frames = 2
         self._next_frame_at = 0
+        self._events_need_redraw = False
         gl._load(self._lib.SDL_GL_GetProcAddress)
         vp = (ctypes.c_int * 4)()
         gl.GetIntegerv(gl.VIEWPORT, vp)
@@ -274,6 +279,8 @@ class GLAppWindow:
             res = self._lib.SDL_WaitEvent(ctypes.byref(ev))
         if not res:
             return False
+        if (ev.type != 0x0400) or self.redraw_on_mouse_motion:
+            self._events_need_redraw = True
         if ev.type == 0x0100:  # SDL_QUIT
             self.quit()
         elif ev.type == 0x0200:  # SDL_WINDOWEVENT
@@ -316,17 +323,26 @@ class GLAppWindow:
         next = None
         while self._active:
             # handle events; wait for events first if needed
-            any_events = self.handle_events()
+            # (until an event arrives that needs a redraw, or the next
+            # requested frame is due)
+            self._events_need_redraw = False
+            self.handle_events()
             if self._requested_frames >= 0:
                 self._requested_frames -= 1
-            elif not any_events:
-                self.handle_event(True, (next - time.time()) if next else None)
-                self.handle_events()
+            else:
+                while self._active and not(self._events_need_redraw):
+                    timeout = (next - time.monotonic()) if next else None
+                    if not(timeout is None) and (timeout < 0.001):
+                        break
+                    self.handle_event(True, timeout)
+                    self.handle_events()
             if not self._active: break
 
             # draw a frame and compute when (and if) the next frame shall be drawn
-            t = time.time()
-            next = self.on_draw(t)
+            # (on_draw() receives wall-clock time for display purposes, but all
+            # scheduling is done on the monotonic clock)
+            t = time.monotonic()
+            next = self.on_draw(time.time())
             # print("next draw at", next)
             if not(next is None): next += t
 
@@ -334,7 +350,7 @@ class GLAppWindow:
             if self._fps_limit > 0.0:
                 if t < self._next_frame_at:
                     time.sleep(self._next_frame_at - t)
-                    t = time.time()
+                    t = time.monotonic()
                 self._next_frame_at = t + 1.0 / self._fps_limit - 0.001
 
             # finally, show the frame
@@ -407,6 +423,7 @@ class GLAppWindow:
         pass
     def on_draw(self, t: float):
         """draw a frame (called every time after handling pending events);
+        t is the current wall-clock time (as in time.time());
         may return a float representing the number of seconds when the next
         draw call shall occur"""
         pass
@@ -1,7 +1,7 @@
 # SPDX-FileCopyrightText: 2024 Martin J. Fiedler <keyj@emphy.de>
 # SPDX-License-Identifier: MIT
 
-__all__ = ['WebRequest', 'safecall']
+__all__ = ['WebRequest', 'safecall', 'cached_localtime']
 
 import json
 import logging
@@ -99,3 +99,17 @@ def safecall(func, *args, **kwargs):
         logging.getLogger("Exception").error("%s in %s:\n/ %s\n\\",
             e.__class__.__name__, func.__name__,
             "".join(lines).rstrip().replace("\n", "\n| "))
+
+###############################################################################
+# MARK: cached_localtime
+
+_localtime_cache = (None, None)
+
+def cached_localtime(t: float):
+    """time.localtime(), but only re-evaluated if the integer part of the
+    timestamp changes (i.e. at most once per second)"""
+    global _localtime_cache
+    key = int(t)
+    if _localtime_cache[0] != key:
+        _localtime_cache = (key, time.localtime(t))
+    return _localtime_cache[1]